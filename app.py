@@ -1,14 +1,125 @@
 
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
+import orjson
+from pydantic import ValidationError
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from cachetools import TTLCache
+from functools import wraps
+import hashlib
 import os
-from datetime import datetime, timedelta
+import threading
+import time
+from datetime import date
+
+from schemas import CreateAppointmentRequest
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, skipping the str round-trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 
 # Configuration for the moving-scheduling-server API
 SCHEDULING_API_URL = os.environ.get("SCHEDULING_API_URL", "http://localhost:5001/api")
 
+# Errors raised while calling the scheduling API or decoding its responses
+UPSTREAM_ERRORS = (requests.RequestException, orjson.JSONDecodeError)
+
+# Shared HTTP session so connections to the scheduling API are kept alive and
+# reused across requests. urllib3's connection pool is thread-safe.
+# Connection errors and transient gateway errors are retried for idempotent
+# methods; once retries run out the last response is returned as-is. Read
+# timeouts are not retried, so a hung server fails a call after one timeout.
+SESSION = requests.Session()
+_retry = Retry(total=3, read=0, backoff_factor=0.2, status_forcelist=[502, 503, 504], raise_on_status=False)
+_adapter = HTTPAdapter(pool_connections=50, pool_maxsize=50, max_retries=_retry)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+SESSION.headers.update({"Accept": "application/json", "Connection": "keep-alive"})
+
+# Upstream calls give up after this many seconds
+SCHEDULING_API_TIMEOUT = float(os.environ.get("SCHEDULING_API_TIMEOUT", "10"))
+
+class SchedulingServiceUnavailable(Exception):
+    """Raised instead of calling the scheduling API while the breaker is open."""
+
+class CircuitBreaker:
+    """
+    Fails fast after `fail_max` consecutive upstream failures, for
+    `reset_timeout` seconds. After that a single trial call is let through;
+    its outcome closes the breaker or keeps it open. The lock only guards
+    the counters and is never held while the upstream call runs.
+    """
+
+    def __init__(self, fail_max, reset_timeout):
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                raise SchedulingServiceUnavailable()
+            # Half-open: let this call through as the trial and keep failing
+            # fast for everyone else until it reports back.
+            self._opened_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self._opened_at is not None:
+                self._opened_at = None
+                app.logger.warning("Scheduling API circuit breaker closed")
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.fail_max:
+                if self._opened_at is None:
+                    app.logger.warning("Scheduling API circuit breaker opened after %d failures", self._failures)
+                self._opened_at = time.monotonic()
+
+# Once the scheduling API has failed several times in a row, fail fast for a
+# while instead of letting every request wait out the timeout.
+BREAKER = CircuitBreaker(fail_max=5, reset_timeout=30)
+
+# Short-lived phone -> customer cache; a conversation tends to look up the
+# same caller several times.
+_CUSTOMER_CACHE = TTLCache(maxsize=10_000, ttl=60)
+_CUSTOMER_CACHE_LOCK = threading.Lock()
+
+# Short-lived per-day appointment cache for availability checks. The cache is
+# per process: a booking or cancellation only drops the entries of the worker
+# that handled it, and bookings made directly on the scheduling server are not
+# seen at all until an entry expires. Clients may also reuse a response for
+# AVAILABILITY_TTL seconds (Cache-Control: max-age), so a client can see a
+# stale day for up to about twice AVAILABILITY_TTL.
+AVAILABILITY_TTL = 15  # seconds
+_APPOINTMENT_CACHE = TTLCache(maxsize=1024, ttl=AVAILABILITY_TTL)
+_APPOINTMENT_CACHE_LOCK = threading.Lock()
+# Bumped on invalidation so a fetch that started earlier does not store stale
+# data afterwards: per date, and globally when every day is dropped.
+_APPOINTMENT_GENERATIONS = {}
+_appointment_generation_all = 0
+
 def get_business_hours():
     """Defines the business hours."""
     return {
@@ -20,6 +131,145 @@ def get_appointment_duration():
     """Defines the assumed duration of an appointment in minutes."""
     return 120  # 2 hours
 
+def _upstream(method, path, **kwargs):
+    """Sends a request to the scheduling API, guarded by the circuit breaker."""
+    BREAKER.before_call()
+    kwargs.setdefault("timeout", SCHEDULING_API_TIMEOUT)
+    try:
+        response = SESSION.request(method, f"{SCHEDULING_API_URL}{path}", **kwargs)
+    except requests.RequestException:
+        BREAKER.record_failure()
+        raise
+    # Server errors count as failures; client errors mean the server is up
+    if response.status_code >= 500:
+        BREAKER.record_failure()
+    else:
+        BREAKER.record_success()
+    return response
+
+def _candidate_slots():
+    """Builds the start times (HH:MM) of every appointment slot in a business day."""
+    business_hours = get_business_hours()
+    start = business_hours["start"]["hour"] * 60 + business_hours["start"]["minute"]
+    end = business_hours["end"]["hour"] * 60 + business_hours["end"]["minute"]
+    return tuple(f"{m // 60:02d}:{m % 60:02d}" for m in range(start, end, get_appointment_duration()))
+
+# Slot start times are fixed by the business hours, so compute them once.
+CANDIDATE_SLOTS = _candidate_slots()
+_SLOT_INDEX = {slot: i for i, slot in enumerate(CANDIDATE_SLOTS)}
+_ALL_SLOTS_MASK = (1 << len(CANDIDATE_SLOTS)) - 1
+
+def _available_slots(appointments):
+    """Returns the candidate slots not taken by any of the given appointments."""
+    # One bit per candidate slot; clear the bits of booked slots. The
+    # scheduling server returns times as HH:MM[:SS].
+    mask = _ALL_SLOTS_MASK
+    for appt in appointments:
+        index = _SLOT_INDEX.get(appt['appointment_time'][:5])
+        if index is not None:
+            mask &= ~(1 << index)
+
+    available = []
+    while mask:
+        lowest = mask & -mask
+        available.append(CANDIDATE_SLOTS[lowest.bit_length() - 1])
+        mask ^= lowest
+    return available
+
+def _fetch_appointments_for_date(date_str):
+    """Fetches all appointments booked on the given date (YYYY-MM-DD)."""
+    response = _upstream("GET", "/appointments", params={"start_date": date_str, "end_date": date_str})
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+def _cached_appointments_for_date(date_str):
+    """Like _fetch_appointments_for_date, but served from a short-lived cache."""
+    with _APPOINTMENT_CACHE_LOCK:
+        appointments = _APPOINTMENT_CACHE.get(date_str)
+        generation = (_appointment_generation_all, _APPOINTMENT_GENERATIONS.get(date_str, 0))
+    if appointments is not None:
+        return appointments
+
+    appointments = _fetch_appointments_for_date(date_str)
+    with _APPOINTMENT_CACHE_LOCK:
+        # Skip the write if the day was invalidated while we were fetching
+        if generation == (_appointment_generation_all, _APPOINTMENT_GENERATIONS.get(date_str, 0)):
+            _APPOINTMENT_CACHE[date_str] = appointments
+    return appointments
+
+def _invalidate_appointments(date_str=None):
+    """Drops a day (or, without a date, every day) from the appointment cache."""
+    global _appointment_generation_all
+    with _APPOINTMENT_CACHE_LOCK:
+        if date_str is None:
+            _appointment_generation_all += 1
+            _APPOINTMENT_GENERATIONS.clear()
+            _APPOINTMENT_CACHE.clear()
+        else:
+            _APPOINTMENT_GENERATIONS[date_str] = _APPOINTMENT_GENERATIONS.get(date_str, 0) + 1
+            _APPOINTMENT_CACHE.pop(date_str, None)
+
+def _find_customer_by_phone(phone):
+    """
+    Returns the customer with the given phone number, or None if there is none.
+    Found customers are cached for a short time.
+    """
+    with _CUSTOMER_CACHE_LOCK:
+        customer = _CUSTOMER_CACHE.get(phone)
+    if customer is not None:
+        return customer
+
+    response = _upstream("GET", "/customers", params={"phone": phone})
+    response.raise_for_status()
+    customers = orjson.loads(response.content)
+    # The filtered result holds at most one record; still check the phone in
+    # case the scheduling server ignores the filter.
+    customer = next((c for c in customers if c['phone'] == phone), None)
+
+    if customer is not None:
+        _cache_customer(phone, customer)
+    return customer
+
+def _cache_customer(phone, customer):
+    """Stores a customer in the phone -> customer cache."""
+    with _CUSTOMER_CACHE_LOCK:
+        _CUSTOMER_CACHE[phone] = customer
+
+def _invalidate_customer(phone):
+    """Drops a phone number from the customer cache."""
+    with _CUSTOMER_CACHE_LOCK:
+        _CUSTOMER_CACHE.pop(phone, None)
+
+def json_body(model):
+    """
+    Validates the JSON request body against a pydantic model and passes the
+    result to the view as `payload`. Invalid bodies get a 400 without
+    entering the view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({"error": "Request body must be a JSON object."}), 400
+            try:
+                payload = model.model_validate(data)
+            except ValidationError as e:
+                fields = sorted({str(err['loc'][0]) for err in e.errors() if err['loc']})
+                return jsonify({"error": f"Missing or invalid fields: {', '.join(fields)}."}), 400
+            return view(*args, payload=payload, **kwargs)
+        return wrapper
+    return decorator
+
+@app.errorhandler(SchedulingServiceUnavailable)
+def scheduling_service_unavailable(e):
+    """
+    Fails fast while the circuit breaker around the scheduling API is open.
+    """
+    response = jsonify({"error": "The scheduling service is temporarily unavailable. Please try again shortly."})
+    response.headers["Retry-After"] = str(BREAKER.reset_timeout)
+    return response, 503
+
 @app.route('/api/availability', methods=['GET'])
 def check_availability():
     """
@@ -32,91 +282,75 @@ def check_availability():
         return jsonify({"error": "A 'date' query parameter is required."}), 400
 
     try:
-        target_date = datetime.strptime(target_date_str, '%Y-%m-%d').date()
+        # Normalise to YYYY-MM-DD; fromisoformat also accepts e.g. YYYYMMDD
+        target_date_str = date.fromisoformat(target_date_str).isoformat()
     except ValueError:
         return jsonify({"error": "Invalid date format. Please use YYYY-MM-DD."}), 400
 
     # Fetch existing appointments for that day
     try:
-        response = requests.get(f"{SCHEDULING_API_URL}/appointments", params={"start_date": target_date_str, "end_date": target_date_str})
-        response.raise_for_status()
-        appointments = response.json()
-    except requests.RequestException as e:
+        appointments = _cached_appointments_for_date(target_date_str)
+    except UPSTREAM_ERRORS as e:
         return jsonify({"error": f"Failed to connect to scheduling service: {e}"}), 500
 
-    # Calculate available slots
-    business_hours = get_business_hours()
-    start_time = datetime.combine(target_date, datetime.min.time()).replace(hour=business_hours["start"]["hour"], minute=business_hours["start"]["minute"])
-    end_time = datetime.combine(target_date, datetime.min.time()).replace(hour=business_hours["end"]["hour"], minute=business_hours["end"]["minute"])
-    
-    appointment_duration = timedelta(minutes=get_appointment_duration())
-    
-    # Create a set of booked time slots for quick lookup
-    booked_slots = set()
-    for appt in appointments:
-        appt_time = datetime.fromisoformat(f"{appt['appointment_date']}T{appt['appointment_time']}").time()
-        booked_slots.add(appt_time)
-
-    available_slots = []
-    current_time = start_time
-    while current_time < end_time:
-        if current_time.time() not in booked_slots:
-            available_slots.append(current_time.strftime('%H:%M'))
-        current_time += appointment_duration
-
-    return jsonify({"available_slots": available_slots})
+    response = jsonify({"available_slots": _available_slots(appointments)})
+    response.cache_control.max_age = AVAILABILITY_TTL
+    response.set_etag(hashlib.blake2b(response.get_data(), digest_size=8).hexdigest())
+    return response.make_conditional(request)
 
 @app.route('/api/appointments', methods=['POST'])
-def create_appointment():
+@json_body(CreateAppointmentRequest)
+def create_appointment(payload):
     """
     Creates a new appointment.
     """
-    data = request.get_json()
-    required_fields = ["customer_phone", "customer_name", "appointment_date", "appointment_time", "origin_address", "destination_address"]
-    if not all(field in data for field in required_fields):
-        return jsonify({"error": "Missing required fields."}), 400
+    appointment_date = payload.appointment_date.isoformat()
+    appointment_time = payload.appointment_time.strftime('%H:%M')
 
     # 1. Find or create the customer
     try:
-        # Search for customer by phone
-        response = requests.get(f"{SCHEDULING_API_URL}/customers")
-        response.raise_for_status()
-        customers = response.json()
-        customer = next((c for c in customers if c['phone'] == data['customer_phone']), None)
+        customer = _find_customer_by_phone(payload.customer_phone)
 
         if customer:
             customer_id = customer['id']
         else:
             # Create a new customer
-            customer_data = {"name": data["customer_name"], "phone": data["customer_phone"]}
-            response = requests.post(f"{SCHEDULING_API_URL}/customers", json=customer_data)
+            customer_data = {"name": payload.customer_name, "phone": payload.customer_phone}
+            response = _upstream("POST", "/customers", json=customer_data)
             response.raise_for_status()
-            customer_id = response.json()['id']
-    except requests.RequestException as e:
+            new_customer = orjson.loads(response.content)
+            customer_id = new_customer['id']
+            # Spare the caller's next lookup a round trip
+            _cache_customer(payload.customer_phone, {**customer_data, **new_customer})
+    except UPSTREAM_ERRORS as e:
         return jsonify({"error": f"Failed to manage customer data: {e}"}), 500
 
     # 2. Create the appointment
     try:
         appointment_data = {
             "customer_id": customer_id,
-            "appointment_date": data["appointment_date"],
-            "appointment_time": data["appointment_time"],
-            "origin_address": data["origin_address"],
-            "destination_address": data["destination_address"],
-            "notes": data.get("notes", ""),
+            "appointment_date": appointment_date,
+            "appointment_time": appointment_time,
+            "origin_address": payload.origin_address,
+            "destination_address": payload.destination_address,
+            "notes": payload.notes or "",
             "status": "scheduled"
         }
-        response = requests.post(f"{SCHEDULING_API_URL}/appointments", json=appointment_data)
+        response = _upstream("POST", "/appointments", json=appointment_data)
+        if 400 <= response.status_code < 500:
+            # The cached customer may be stale (e.g. deleted upstream).
+            _invalidate_customer(payload.customer_phone)
         response.raise_for_status()
-        new_appointment = response.json()
-    except requests.RequestException as e:
+        _invalidate_appointments(appointment_date)
+        new_appointment = orjson.loads(response.content)
+    except UPSTREAM_ERRORS as e:
         return jsonify({"error": f"Failed to create appointment: {e}"}), 500
 
     return jsonify({
         "appointment_id": new_appointment['id'],
         "customer_id": customer_id,
         "status": new_appointment['status'],
-        "message": f"Appointment successfully scheduled for {data['customer_name']} on {data['appointment_date']} at {data['appointment_time']}."
+        "message": f"Appointment successfully scheduled for {payload.customer_name} on {appointment_date} at {appointment_time}."
     }), 201
 
 @app.route('/api/appointments/by-phone/<string:phone_number>', methods=['GET'])
@@ -126,37 +360,33 @@ def get_appointments_by_phone(phone_number):
     """
     # 1. Find the customer by phone
     try:
-        response = requests.get(f"{SCHEDULING_API_URL}/customers")
-        response.raise_for_status()
-        customers = response.json()
-        customer = next((c for c in customers if c['phone'] == phone_number), None)
+        customer = _find_customer_by_phone(phone_number)
 
         if not customer:
             return jsonify({"appointments": []}) # No customer, so no appointments
-    except requests.RequestException as e:
+    except UPSTREAM_ERRORS as e:
         return jsonify({"error": f"Failed to find customer: {e}"}), 500
 
-    # 2. Get all appointments for that customer
+    # 2. Get upcoming appointments for that customer
     try:
-        response = requests.get(f"{SCHEDULING_API_URL}/appointments")
+        # ISO dates (YYYY-MM-DD) compare correctly as strings
+        today_str = date.today().isoformat()
+        params = {"customer_id": customer['id'], "start_date": today_str}
+        response = _upstream("GET", "/appointments", params=params)
         response.raise_for_status()
-        all_appointments = response.json()
-        
-        customer_appointments = [
-            appt for appt in all_appointments 
-            if appt['customer_id'] == customer['id'] and datetime.fromisoformat(appt['appointment_date']).date() >= datetime.today().date()
-        ]
-        
-        # Format for the response
+        appointments = orjson.loads(response.content)
+
+        # Filter (in case the filters were ignored) and format in one pass
         formatted_appointments = [{
             "appointment_id": appt['id'],
             "appointment_date": appt['appointment_date'],
             "appointment_time": appt['appointment_time'],
             "status": appt['status'],
             "origin_address": appt['origin_address']
-        } for appt in customer_appointments]
+        } for appt in appointments
+            if appt['customer_id'] == customer['id'] and appt['appointment_date'] >= today_str]
 
-    except requests.RequestException as e:
+    except UPSTREAM_ERRORS as e:
         return jsonify({"error": f"Failed to retrieve appointments: {e}"}), 500
 
     return jsonify({"appointments": formatted_appointments})
@@ -167,16 +397,20 @@ def cancel_appointment(appointment_id):
     Cancels an appointment by its ID.
     """
     try:
-        response = requests.delete(f"{SCHEDULING_API_URL}/appointments/{appointment_id}")
+        response = _upstream("DELETE", f"/appointments/{appointment_id}")
         
         if response.status_code == 404:
             return jsonify({"error": "Appointment not found."}), 404
         
         response.raise_for_status() # Raise for other errors (e.g., 500)
-        
+
+        # The appointment's date is unknown here, so drop every cached day
+        _invalidate_appointments()
+
         return jsonify({"message": f"Appointment {appointment_id} has been successfully cancelled."}), 200
-    except requests.RequestException as e:
+    except UPSTREAM_ERRORS as e:
         return jsonify({"error": f"Failed to cancel appointment: {e}"}), 500
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5002, debug=True)
+    # Development server only; use gunicorn (see gunicorn.conf.py) in production.
+    app.run(host='0.0.0.0', port=5002, debug=os.environ.get("FLASK_DEBUG") == "1", threaded=True)
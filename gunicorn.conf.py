@@ -0,0 +1,18 @@
+# Gunicorn configuration for running the MCP server in production:
+#
+#     gunicorn app:app
+#
+# Handlers spend nearly all of their time waiting on the scheduling API, so
+# workers are gevent-based and keep many upstream calls in flight on a few OS
+# threads. The gevent worker monkey-patches the standard library before the
+# app is imported (preload_app must stay off for that), which makes requests'
+# socket I/O cooperative.
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5002')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+# Only used by the gthread worker class
+threads = int(os.environ.get("GUNICORN_THREADS", 32))
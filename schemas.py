@@ -0,0 +1,35 @@
+from datetime import date, time
+
+from pydantic import BaseModel, field_validator
+
+
+class CreateAppointmentRequest(BaseModel):
+    """Request body for POST /api/appointments."""
+
+    customer_phone: str
+    customer_name: str
+    appointment_date: date
+    appointment_time: time
+    origin_address: str
+    destination_address: str
+    notes: str | None = ""
+
+    # Only ISO strings are accepted; pydantic's lax mode would otherwise take
+    # numbers (e.g. seconds since midnight) as dates and times.
+    @field_validator('appointment_date', mode='before')
+    @classmethod
+    def _parse_date(cls, value):
+        if not isinstance(value, str):
+            raise ValueError("date must be a YYYY-MM-DD string")
+        return date.fromisoformat(value)
+
+    @field_validator('appointment_time', mode='before')
+    @classmethod
+    def _parse_time(cls, value):
+        if not isinstance(value, str):
+            raise ValueError("time must be an HH:MM string")
+        parsed = time.fromisoformat(value)
+        # Slots are whole minutes; refuse anything that HH:MM would truncate
+        if parsed.second or parsed.microsecond or parsed.tzinfo is not None:
+            raise ValueError("time must be an HH:MM string")
+        return parsed
@@ -0,0 +1,225 @@
+import socket
+import threading
+import time
+
+import orjson
+import pytest
+import requests
+
+import app as app_module
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, content=b"[]"):
+        self.status_code = status_code
+        self.content = content
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error", response=self)
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(app_module, "BREAKER", app_module.CircuitBreaker(fail_max=5, reset_timeout=30))
+    app_module._APPOINTMENT_CACHE.clear()
+    app_module._CUSTOMER_CACHE.clear()
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def scheduling_api(monkeypatch):
+    """Fakes the scheduling server with one known customer; records posted appointments."""
+    posted = []
+
+    def fake_request(method, url, **kwargs):
+        path = url[len(app_module.SCHEDULING_API_URL):]
+        if method == "GET" and path == "/customers":
+            return FakeResponse(content=orjson.dumps([{"id": 1, "phone": "5551234567"}]))
+        if method == "POST" and path == "/appointments":
+            posted.append(kwargs["json"])
+            return FakeResponse(201, orjson.dumps({"id": 7, "status": "scheduled"}))
+        return FakeResponse(404, b"{}")
+
+    monkeypatch.setattr(app_module.SESSION, "request", fake_request)
+    return posted
+
+
+APPOINTMENT = {
+    "customer_phone": "5551234567",
+    "customer_name": "Ada",
+    "appointment_date": "2031-03-01",
+    "appointment_time": "09:00",
+    "origin_address": "1 Old St",
+    "destination_address": "2 New St",
+}
+
+
+def test_create_appointment_accepts_null_notes(client, scheduling_api):
+    response = client.post("/api/appointments", json={**APPOINTMENT, "notes": None})
+    assert response.status_code == 201
+    assert scheduling_api[0]["notes"] == ""
+
+
+@pytest.mark.parametrize("field,value", [
+    ("appointment_date", 20310301),
+    ("appointment_time", 50400),
+    ("appointment_time", "14:00:30"),
+])
+def test_create_appointment_rejects_non_iso_date_and_time(client, scheduling_api, field, value):
+    response = client.post("/api/appointments", json={**APPOINTMENT, field: value})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": f"Missing or invalid fields: {field}."}
+    assert scheduling_api == []
+
+
+def test_create_appointment_accepts_whole_minute_seconds(client, scheduling_api):
+    response = client.post("/api/appointments", json={**APPOINTMENT, "appointment_time": "14:00:00"})
+    assert response.status_code == 201
+    assert scheduling_api[0]["appointment_time"] == "14:00"
+    assert scheduling_api[0]["appointment_date"] == "2031-03-01"
+
+
+@pytest.mark.parametrize("invalidated", ["2031-03-01", None])
+def test_invalidation_during_fetch_is_not_overwritten(monkeypatch, invalidated):
+    def fetch_while_booking(date_str):
+        # A booking lands between the upstream read and the cache write
+        app_module._invalidate_appointments(invalidated)
+        return []
+
+    monkeypatch.setattr(app_module, "_fetch_appointments_for_date", fetch_while_booking)
+    assert app_module._cached_appointments_for_date("2031-03-01") == []
+    assert "2031-03-01" not in app_module._APPOINTMENT_CACHE
+
+
+def test_upstream_calls_overlap(monkeypatch):
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def slow_request(method, url, **kwargs):
+        nonlocal in_flight, max_in_flight
+        with lock:
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+        time.sleep(0.2)
+        with lock:
+            in_flight -= 1
+        return FakeResponse()
+
+    monkeypatch.setattr(app_module.SESSION, "request", slow_request)
+
+    threads = [threading.Thread(target=app_module._upstream, args=("GET", "/appointments")) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max_in_flight == 2
+
+
+def test_hung_upstream_fails_after_one_timeout(monkeypatch, client):
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    connections = []
+
+    def accept_and_hang():
+        # Accept connections but never answer them
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            connections.append(conn)
+
+    threading.Thread(target=accept_and_hang, daemon=True).start()
+    monkeypatch.setattr(app_module, "SCHEDULING_API_URL", f"http://127.0.0.1:{server.getsockname()[1]}/api")
+    monkeypatch.setattr(app_module, "SCHEDULING_API_TIMEOUT", 0.3)
+
+    started = time.monotonic()
+    try:
+        response = client.get("/api/availability?date=2031-03-01")
+        elapsed = time.monotonic() - started
+    finally:
+        server.close()
+        for conn in connections:
+            conn.close()
+
+    assert response.status_code == 500
+    assert len(connections) == 1
+    assert elapsed < 0.3 * 2
+
+
+def test_breaker_opens_after_consecutive_failures(monkeypatch, client):
+    calls = []
+
+    def failing_request(method, url, **kwargs):
+        calls.append(url)
+        raise requests.ConnectionError("refused")
+
+    monkeypatch.setattr(app_module.SESSION, "request", failing_request)
+
+    for day in range(1, 6):
+        response = client.get(f"/api/availability?date=2030-01-0{day}")
+        assert response.status_code == 500
+
+    response = client.get("/api/availability?date=2030-01-06")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
+    assert len(calls) == 5
+
+
+def test_breaker_counts_server_errors_but_not_client_errors(monkeypatch):
+    status = 404
+    monkeypatch.setattr(app_module.SESSION, "request", lambda method, url, **kwargs: FakeResponse(status))
+
+    for _ in range(10):
+        app_module._upstream("GET", "/customers")
+
+    status = 503
+    for _ in range(5):
+        app_module._upstream("GET", "/customers")
+    with pytest.raises(app_module.SchedulingServiceUnavailable):
+        app_module._upstream("GET", "/customers")
+
+
+def test_breaker_trial_call_closes_it(monkeypatch):
+    breaker = app_module.BREAKER
+    for _ in range(5):
+        breaker.record_failure()
+    with pytest.raises(app_module.SchedulingServiceUnavailable):
+        breaker.before_call()
+
+    # Pretend the reset timeout has passed: one trial call goes through
+    breaker._opened_at -= breaker.reset_timeout
+    breaker.before_call()
+    with pytest.raises(app_module.SchedulingServiceUnavailable):
+        breaker.before_call()
+
+    breaker.record_success()
+    breaker.before_call()
+
+
+@pytest.mark.parametrize("body", [[1], [], "x", "", 5, 0, False, None])
+def test_create_appointment_rejects_non_object_body(client, body):
+    response = client.post("/api/appointments", json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Request body must be a JSON object."}
+
+
+def test_create_appointment_rejects_non_json_body(client):
+    response = client.post("/api/appointments", data="customer_phone=555",
+                           content_type="application/x-www-form-urlencoded")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Request body must be a JSON object."}
+
+
+def test_create_appointment_lists_invalid_fields(client):
+    response = client.post("/api/appointments", json={"customer_phone": "555"})
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith("Missing or invalid fields: appointment_date")